@@ -1,3 +1,5 @@
+import os
+
 from monaifbs.__about__ import (
     __author__,
     __email__,
@@ -12,4 +14,19 @@ __all__ = [
     "__license__",
     "__summary__",
     "__version__",
+    "resource_path",
 ]
+
+
+def resource_path(*relative):
+    """
+    Return the path to a resource shipped with the package (e.g. a config file or a pretrained
+    model), given its path components relative to the package root. Uses importlib.resources
+    where available, so zip/wheel installs are supported too, and falls back to resolving
+    against the package directory on older Python versions.
+    """
+    try:
+        from importlib.resources import files
+    except ImportError:
+        return os.path.join(os.path.dirname(__file__), *relative)
+    return str(files(__name__).joinpath("/".join(relative)))
@@ -56,8 +56,7 @@ if __name__ == '__main__':
     # check existence of config file and read it
     config_file = args.config_file
     if config_file is None:
-        config_file = os.path.join(*[os.path.dirname(monaifbs.__file__),
-                                     "config", "monai_dynUnet_inference_config.yml"])
+        config_file = monaifbs.resource_path("config", "monai_dynUnet_inference_config.yml")
     if not os.path.isfile(config_file):
         raise FileNotFoundError('Expected config file: {} not found'.format(config_file))
     with open(config_file) as f:
@@ -66,8 +65,7 @@ if __name__ == '__main__':
         config = yaml.load(f, Loader=yaml.FullLoader)
 
     if config['inference']['model_to_load'] == "default":
-        config['inference']['model_to_load'] = os.path.join(*[os.path.dirname(monaifbs.__file__),
-                                                    "models", "checkpoint_dynUnet_DiceXent.pt"])
+        config['inference']['model_to_load'] = monaifbs.resource_path("models", "checkpoint_dynUnet_DiceXent.pt")
 
     assert len(args.input_names) == len(args.segment_output_names), "The numbers of input output filenames do not match"
 
@@ -78,8 +76,7 @@ if __name__ == '__main__':
         out_folder = os.path.dirname(seg)
         if not out_folder:
             out_folder = os.getcwd()
-        if not os.path.exists(out_folder):
-            os.makedirs(out_folder)
+        os.makedirs(out_folder, exist_ok=True)
         config['output'] = {'out_postfix': 'seg', 'out_dir': out_folder}
 
         # run inference
@@ -95,7 +92,7 @@ if __name__ == '__main__':
             img_filename = img_filename[:-4]
         out_filename = img_filename + '_' + config['output']['out_postfix'] + '.nii.gz' if flag_zip \
             else img_filename + '_' + config['output']['out_postfix'] + '.nii'
-        out_filename = os.path.join(*[out_folder, img_filename, out_filename])
+        out_filename = os.path.join(out_folder, img_filename, out_filename)
 
         # check existence of segmentation file
         if not os.path.exists(out_filename):
@@ -24,14 +24,13 @@
 import os
 import sys
 import yaml
-import argparse
 import logging
 import torch
 
 from torch.utils.data import DataLoader
 
 from monai.config import print_config
-from monai.data import DataLoader, Dataset
+from monai.data import Dataset, list_data_collate, worker_init_fn
 from monai.networks.nets import DynUNet
 from monai.engines import SupervisedEvaluator
 from monai.handlers import CheckpointLoader, SegmentationSaver, StatsHandler
@@ -147,10 +146,21 @@ def run_inference(input_data, config_info):
         ]
     )
     # create a validation data loader
+    # pin host memory (so host-to-device copies can run asynchronously) and, when workers are
+    # used, keep them alive across runs and bound how many batches each one loads in advance.
+    # torch.utils.data.DataLoader is used directly (with MONAI's collate and worker-init
+    # functions) because the monai.data.DataLoader wrapper in 0.3.0 does not accept the
+    # persistent_workers/prefetch_factor keywords
     val_ds = Dataset(data=val_files, transform=val_transforms)
+    num_workers = config_info['device']['num_workers']
+    dataloader_kwargs = {'num_workers': num_workers, 'pin_memory': torch.cuda.is_available(),
+                         'collate_fn': list_data_collate, 'worker_init_fn': worker_init_fn}
+    if num_workers > 0:
+        dataloader_kwargs['persistent_workers'] = True
+        dataloader_kwargs['prefetch_factor'] = config_info['device'].get('prefetch_factor', 2)
     val_loader = DataLoader(val_ds,
                             batch_size=1,
-                            num_workers=config_info['device']['num_workers'])
+                            **dataloader_kwargs)
 
     def prepare_batch(batchdata):
         assert isinstance(batchdata, dict), "prepare_batch expects dictionary input data."
@@ -169,12 +179,14 @@ def run_inference(input_data, config_info):
     sizes = patch_size[:2]
     strides, kernels = [], []
     while True:
-        spacing_ratio = [sp / min(spacings) for sp in spacings]
+        min_spacing = min(spacings)
+        spacing_ratio = [sp / min_spacing for sp in spacings]
         stride = [2 if ratio <= 2 and size >= 8 else 1 for (ratio, size) in zip(spacing_ratio, sizes)]
         kernel = [3 if ratio <= 2 else 1 for ratio in spacing_ratio]
         if all(s == 1 for s in stride):
             break
-        sizes = [i / j for i, j in zip(sizes, stride)]
+        # the strides are powers of two, so integer division keeps the sizes exact (no float drift)
+        sizes = [i // j for i, j in zip(sizes, stride)]
         spacings = [i * j for i, j in zip(spacings, stride)]
         kernels.append(kernel)
         strides.append(stride)
@@ -233,17 +245,24 @@ def run_inference(input_data, config_info):
             inputs = inputs.to(engine.state.device)
             if targets is not None:
                 targets = targets.to(engine.state.device)
-            flip_inputs_1 = torch.flip(inputs, dims=(2,))
-            flip_inputs_2 = torch.flip(inputs, dims=(3,))
-            flip_inputs_3 = torch.flip(inputs, dims=(2, 3))
 
             def _compute_pred():
-                pred = self.inferer(inputs, self.network)
-                # use random flipping as data augmentation at inference
-                flip_pred_1 = torch.flip(self.inferer(flip_inputs_1, self.network), dims=(2,))
-                flip_pred_2 = torch.flip(self.inferer(flip_inputs_2, self.network), dims=(3,))
-                flip_pred_3 = torch.flip(self.inferer(flip_inputs_3, self.network), dims=(2, 3))
-                return (pred + flip_pred_1 + flip_pred_2 + flip_pred_3) / 4
+                # use flipping as data augmentation at inference: stack the original and the three
+                # flipped orientations along the batch dimension so a single sliding-window sweep
+                # covers all of them, then undo the flips on the predictions and average
+                stacked = torch.cat([inputs,
+                                     torch.flip(inputs, dims=(2,)),
+                                     torch.flip(inputs, dims=(3,)),
+                                     torch.flip(inputs, dims=(2, 3))], dim=0)
+                pred, flip_pred_1, flip_pred_2, flip_pred_3 = torch.chunk(
+                    self.inferer(stacked, self.network), 4, dim=0)
+                # accumulate the un-flipped predictions in place (into the first chunk of the
+                # inferer output) rather than materialising intermediate sums
+                pred += torch.flip(flip_pred_1, dims=(2,))
+                pred += torch.flip(flip_pred_2, dims=(3,))
+                pred += torch.flip(flip_pred_3, dims=(2, 3))
+                pred /= 4
+                return pred
 
             # execute forward computation
             self.network.eval()
@@ -277,6 +296,8 @@ def run_inference(input_data, config_info):
 
 
 if __name__ == '__main__':
+    # argparse is only needed when running as a script, keep it off the import path
+    import argparse
 
     parser = argparse.ArgumentParser(description='Run inference with dynUnet with MONAI.')
     parser.add_argument('--in_files',
@@ -309,8 +330,7 @@ if __name__ == '__main__':
     # check existence of config file and read it
     config_file = args.config_file
     if config_file is None:
-        config_file = os.path.join(*[os.path.dirname(monaifbs.__file__),
-                                     "config", "monai_dynUnet_inference_config.yml"])
+        config_file = monaifbs.resource_path("config", "monai_dynUnet_inference_config.yml")
     if not os.path.isfile(config_file):
         raise FileNotFoundError('Expected config file: {} not found'.format(config_file))
     with open(config_file) as f:
@@ -323,12 +343,10 @@ if __name__ == '__main__':
 
     # add the output directory to the config dictionary
     config['output'] = {'out_postfix': args.out_postfix, 'out_dir': args.out_folder}
-    if not os.path.exists(config['output']['out_dir']):
-        os.makedirs(config['output']['out_dir'])
+    os.makedirs(config['output']['out_dir'], exist_ok=True)
 
     if config['inference']['model_to_load'] == "default":
-        config['inference']['model_to_load'] = os.path.join(*[os.path.dirname(monaifbs.__file__),
-                                                    "models", "checkpoint_dynUnet_DiceXent.pt"])
+        config['inference']['model_to_load'] = monaifbs.resource_path("models", "checkpoint_dynUnet_DiceXent.pt")
 
     # run inference with MONAI dynUnet
     run_inference(in_files, config)
@@ -23,61 +23,84 @@
 # This code was adapted from the dynUNet tutorial in MONAI
 # https://github.com/Project-MONAI/tutorials/blob/master/modules/dynunet_tutorial.ipynb
 
+# only the standard library is imported at module level: torch/MONAI (and their CUDA shared
+# libraries) take seconds to import and are only pulled in inside the functions that need them,
+# so that argument validation and --help invocations stay fast
 import os
 import sys
+import json
+import stat
 import logging
-import yaml
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-import argparse
 from pathlib import Path
-
-import torch
-from torch.nn.functional import interpolate
-
-from torch.utils.tensorboard import SummaryWriter
-from monai.config import print_config
-from monai.data import DataLoader, PersistentDataset
-from monai.utils import misc, set_determinism
-from monai.engines import SupervisedTrainer
-from monai.networks.nets import DynUNet
-from monai.transforms import (
-    Compose,
-    LoadNiftid,
-    AddChanneld,
-    CropForegroundd,
-    SpatialPadd,
-    NormalizeIntensityd,
-    RandSpatialCropd,
-    RandZoomd,
-    RandGaussianNoised,
-    RandGaussianSmoothd,
-    RandScaleIntensityd,
-    RandRotated,
-    RandFlipd,
-    SqueezeDimd,
-    ToTensord,
-)
-
-from monai.engines import SupervisedEvaluator
-from monai.handlers import (
-    LrScheduleHandler,
-    StatsHandler,
-    CheckpointSaver,
-    MeanDice,
-    TensorBoardImageHandler,
-    TensorBoardStatsHandler,
-    ValidationHandler,
-    CheckpointLoader
-)
-from monai.inferers import SimpleInferer
-
-from monaifbs.src.utils.custom_transform import InPlaneSpacingd
-from monaifbs.src.utils.custom_losses import DiceCELoss, DiceLossExtended
-from monaifbs.src.utils.custom_inferer import SlidingWindowInferer2D
+from typing import Optional
 
 import monaifbs
 
 
+@dataclass(frozen=True)
+class OutputSettings:
+    """
+    Immutable bundle of the output locations of a training run, extracted once from the parsed
+    config dict so the path handling below works on a small hashable object instead of repeated
+    nested-dict lookups.
+    """
+    out_dir: str
+    out_postfix: str
+    cache_dir: Optional[str] = None
+
+
+def _stat_file(path):
+    """
+    Single-os.stat replacement for the os.path.isfile + os.path.getsize pair, halving the
+    syscalls on the startup path.
+    Args:
+        path: str, filename to check
+    Return:
+        int, size of the file in bytes, or -1 if path does not exist or is not a regular file
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return -1
+    return st.st_size if stat.S_ISREG(st.st_mode) else -1
+
+
+def load_config_file(config_file):
+    """
+    Read the configuration parameters from file, reusing a sibling .cache.json copy when fresh.
+    After the first YAML parse the resulting dict is serialized to JSON next to the config file;
+    later runs load the (C-accelerated) JSON directly instead of re-tokenizing the YAML, falling
+    back to the YAML whenever the cache is stale, unreadable or cannot be written.
+    Args:
+        config_file: str, path to the .yml file with the configuration parameters
+    Return:
+        config: dict, contains the parsed configuration parameters
+    """
+    import yaml
+
+    cache_file = config_file + ".cache.json"
+    try:
+        if os.path.getmtime(cache_file) >= os.path.getmtime(config_file):
+            with open(cache_file) as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    with open(config_file) as f:
+        # prefer the libyaml-backed C loader when pyyaml was built with it (2-3x faster parse);
+        # SafeLoader semantics are sufficient for a plain config dict
+        config = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+    try:
+        with open(cache_file, "w") as f:
+            json.dump(config, f)
+    except OSError:
+        # the config may live in a read-only install location, the cache is only an optimization
+        pass
+    return config
+
+
 def create_data_list_of_dictionaries(input_file):
     """
     Convert the list of input files to be processed in the dictionary format needed for MONAI
@@ -88,26 +111,30 @@ def create_data_list_of_dictionaries(input_file):
     Return
         full_list: list of dicts, storing the filenames input to the MONAI training pipeline
     """
-    full_list = []
-    with open(input_file, 'r') as data:
-        for line in data:
-            # remove newline character if present
-            line = line.rstrip('\n') if '\n' in line else line
-            # split image and segmentation filenames
-            try:
-                current_f, current_s = line.split(',')
-            except ValueError as ve:
-                print('ValueError: {} in function create_data_list_of_dictionaries()'.format(ve))
-                print("Incorrect format for file {}. A two-column .txt or .csv file (with no header) is expected, "
-                      "storing the image filenames in the first column and respective segmentation in "
-                      "the second column, separated by a comma. Format of each line:"
-                      "/path/to/image.nii.gz,/path/to/seg.nii.gz".format(input_file))
-                exit()
-            if os.path.isfile(current_f) and os.path.isfile(current_s):
-                full_list.append({"image": current_f, "label": current_s})
-            else:
-                raise FileNotFoundError('Expected image file: {} or segmentation file: {} not found'.format(current_f,
-                                                                                                            current_s))
+    import pandas as pd
+
+    # parse the whole file at once with the pandas C parser instead of looping over the lines
+    format_error = ("Incorrect format for file {}. A two-column .txt or .csv file (with no header) is expected, "
+                    "storing the image filenames in the first column and respective segmentation in "
+                    "the second column, separated by a comma. Format of each line:"
+                    "/path/to/image.nii.gz,/path/to/seg.nii.gz".format(input_file))
+    try:
+        frame = pd.read_csv(input_file, header=None, dtype=str, engine='c', memory_map=True)
+    except pd.errors.ParserError as pe:
+        raise ValueError('{} ({})'.format(format_error, pe))
+    if frame.shape[1] != 2 or frame.isnull().values.any():
+        raise ValueError(format_error)
+
+    # fan the per-file existence checks out to a thread pool so the stat latencies overlap
+    all_files = frame.values.ravel()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        found = list(executor.map(os.path.isfile, all_files))
+    if not all(found):
+        first_missing = found.index(False) // 2
+        raise FileNotFoundError('Expected image file: {} or segmentation file: {} not found'
+                                .format(frame.iat[first_missing, 0], frame.iat[first_missing, 1]))
+
+    full_list = [{"image": current_f, "label": current_s} for current_f, current_s in zip(frame[0], frame[1])]
     return full_list
 
 
@@ -131,6 +158,7 @@ def choose_loss_function(number_out_channels, config_dict):
     Return:
         loss_function: callable, selected loss function type.
     """
+    from monaifbs.src.utils.custom_losses import DiceCELoss, DiceLossExtended
 
     # set some parameters for the Dice Loss
     do_sigmoid = True
@@ -205,6 +233,59 @@ def run_training(train_file_list, valid_file_list, config_info):
         config_info: dict, contains configuration parameters for sampling, network and training.
             See monaifbs/config/monai_dynUnet_training_config.yml for an example of the expected fields.
     """
+    import yaml
+
+    import numpy as np
+    import torch
+    from torch.nn.functional import interpolate
+    from torch.utils.data import DataLoader
+
+    from torch.utils.tensorboard import SummaryWriter
+    from monai.config import print_config
+    from monai.data import CacheDataset, list_data_collate, worker_init_fn
+    from monai.utils import set_determinism
+    from monai.engines import SupervisedEvaluator, SupervisedTrainer
+    from monai.networks.nets import DynUNet
+    from monai.transforms import (
+        Compose,
+        AddChanneld,
+        CastToTyped,
+        CropForegroundd,
+        SpatialPadd,
+        NormalizeIntensityd,
+        RandSpatialCropd,
+        RandGaussianNoised,
+        RandGaussianSmoothd,
+        RandScaleIntensityd,
+        RandFlipd,
+        SqueezeDimd,
+        ToTensord,
+    )
+    from monai.handlers import (
+        LrScheduleHandler,
+        StatsHandler,
+        CheckpointSaver,
+        MeanDice,
+        TensorBoardImageHandler,
+        TensorBoardStatsHandler,
+        ValidationHandler,
+        CheckpointLoader
+    )
+    from monai.inferers import SimpleInferer
+
+    from monaifbs.src.utils.custom_transform import (
+        InPlaneSpacingd,
+        LoadNiftiMMapd,
+        RandAffineSkipd,
+        RandBatchAugmentGPU,
+    )
+    from monaifbs.src.utils.custom_inferer import SlidingWindowInferer2D
+    from monaifbs.src.utils.custom_loader import (
+        HashKeyedPersistentDataset,
+        InMemoryPersistentDataset,
+        PatchBankDataset,
+        RollingPrefetchDataset,
+    )
 
     """
     Read input and configuration parameters
@@ -238,6 +319,26 @@ def run_training(train_file_list, valid_file_list, config_info):
     else:
         model_to_load = None
 
+    # use automatic mixed precision unless explicitly disabled (ignored when training on CPU)
+    use_amp = config_info['training'].get('amp', True) and torch.cuda.is_available()
+
+    # precision used inside the autocast regions: float16 (default, needs the gradient scaler)
+    # or bfloat16, which keeps the float32 exponent range so gradient scaling is unnecessary,
+    # but requires hardware support (Ampere or newer)
+    amp_dtype = 'float16'
+    if use_amp and config_info['training'].get('amp_dtype', 'float16') == 'bfloat16':
+        if hasattr(torch.cuda, 'is_bf16_supported') and torch.cuda.is_bf16_supported():
+            amp_dtype = 'bfloat16'
+        else:
+            print("bfloat16 requested but not supported on this GPU, falling back to float16")
+    print("Using automatic mixed precision = {} (dtype = {})".format(use_amp, amp_dtype))
+
+    def autocast_region():
+        # older torch versions have no dtype argument on autocast (and no bfloat16 support)
+        if amp_dtype == 'bfloat16':
+            return torch.cuda.amp.autocast(dtype=torch.bfloat16)
+        return torch.cuda.amp.autocast()
+
     # set up either GPU or CPU usage
     if torch.cuda.is_available():
         print("\n#### GPU INFORMATION ###")
@@ -247,6 +348,14 @@ def run_training(train_file_list, valid_file_list, config_info):
         current_device = torch.device("cpu")
         print("Using device: {}".format(current_device))
 
+    # optionally run most random augmentations batched on the GPU inside the trainer, keeping the
+    # dataloader workers limited to the deterministic preprocessing and the random crop
+    if config_info['device'].get('gpu_augmentation', False) and torch.cuda.is_available():
+        batch_augment = RandBatchAugmentGPU()
+        print("Running random augmentations batched on the GPU")
+    else:
+        batch_augment = None
+
     # set determinism if required
     if 'manual_seed' in config_info['training'].keys() and config_info['training']['manual_seed'] is not None:
         seed = config_info['training']['manual_seed']
@@ -256,16 +365,29 @@ def run_training(train_file_list, valid_file_list, config_info):
         print("Using determinism with seed = {}\n".format(seed))
         set_determinism(seed=seed)
 
+    # with a fixed patch size every mini-batch has identical conv shapes, so let cuDNN benchmark
+    # the fastest algorithm once and reuse it; also allow TF32 math where the hardware supports it.
+    # Both are skipped when a manual seed is set, as they would break determinism.
+    if torch.cuda.is_available() and seed is None and config_info['device'].get('cudnn_benchmark', True):
+        print("Enabling cudnn benchmark mode (and TF32 where available)\n")
+        torch.backends.cudnn.benchmark = True
+        if hasattr(torch.backends.cudnn, 'allow_tf32'):
+            torch.backends.cudnn.allow_tf32 = True
+            torch.backends.cuda.matmul.allow_tf32 = True
+
     """
     Setup data output directory
     """
-    out_model_dir = os.path.join(config_info['output']['out_dir'],
+    out_settings = OutputSettings(out_dir=config_info['output']['out_dir'],
+                                  out_postfix=config_info['output']['out_postfix'],
+                                  cache_dir=config_info['output'].get('cache_dir'))
+    out_model_dir = os.path.join(out_settings.out_dir,
                                  datetime.now().strftime('%Y-%m-%d_%H-%M-%S') + '_' +
-                                 config_info['output']['out_postfix'])
+                                 out_settings.out_postfix)
     print("Saving to directory {}\n".format(out_model_dir))
     # create cache directory to store results for Persistent Dataset
-    if 'cache_dir' in config_info['output'].keys():
-        out_cache_dir = config_info['output']['cache_dir']
+    if out_settings.cache_dir is not None:
+        out_cache_dir = out_settings.cache_dir
     else:
         out_cache_dir = os.path.join(out_model_dir, 'persistent_cache')
     persistent_cache: Path = Path(out_cache_dir)
@@ -295,9 +417,15 @@ def run_training(train_file_list, valid_file_list, config_info):
     # - Apply data augmentation (RandZoomd, RandRotated, RandGaussianNoised, RandGaussianSmoothd, RandScaleIntensityd,
     #       RandFlipd)
     # - ToTensor: convert to pytorch tensor
+    # when the data loading runs in the main process, the per-sample affine resampling can be
+    # executed on the GPU (CUDA cannot be used inside forked dataloader workers); the result is
+    # converted back to numpy so the remaining CPU transforms are unaffected
+    affine_device = None
+    if torch.cuda.is_available() and config_info['device']['num_workers'] == 0:
+        affine_device = current_device
     train_transforms = Compose(
         [
-            LoadNiftid(keys=["image", "label"]),
+            LoadNiftiMMapd(keys=["image", "label"]),
             AddChanneld(keys=["image", "label"]),
             CropForegroundd(keys=["image", "label"], source_key="image"),
             InPlaneSpacingd(
@@ -308,19 +436,30 @@ def run_training(train_file_list, valid_file_list, config_info):
             SpatialPadd(keys=["image", "label"], spatial_size=patch_size,
                         mode=["constant", "edge"]),
             NormalizeIntensityd(keys=["image"], nonzero=False, channel_wise=True),
+            # cast to compact dtypes at the end of the deterministic chain, so the cached tensors
+            # take half (image) and an eighth (label) of the float32/int64 footprint
+            CastToTyped(keys=["image", "label"], dtype=(np.float16, np.uint8)),
             RandSpatialCropd(keys=["image", "label"], roi_size=patch_size, random_size=False),
             SqueezeDimd(keys=["image", "label"], dim=-1),
-            RandZoomd(
+            # restore full precision for the random resampling transforms and the network input
+            CastToTyped(keys=["image", "label"], dtype=(np.float32, np.float32)),
+        ]
+        + ([
+            # zoom and rotation fused in a single affine resampling, so each patch is
+            # interpolated once instead of twice; prob and ranges approximately preserve the
+            # previous combination of zoom in [0.9, 1.2] (prob=0.16) and +/-90 deg rotation (prob=0.2).
+            # The Skipd variant avoids the identity-grid resampling MONAI 0.3.0 applies to
+            # samples whose probability draw fails
+            RandAffineSkipd(
                 keys=["image", "label"],
-                min_zoom=0.9,
-                max_zoom=1.2,
+                prob=0.33,
+                rotate_range=np.pi / 2,
+                scale_range=(0.15, 0.15),
                 mode=("bilinear", "nearest"),
-                align_corners=(True, None),
-                prob=0.16,
+                padding_mode=("zeros", "border"),
+                as_tensor_output=False,
+                device=affine_device,
             ),
-            RandRotated(keys=["image", "label"], range_x=90, range_y=90, prob=0.2,
-                        keep_size=True, mode=["bilinear", "nearest"],
-                        padding_mode=["zeros", "border"]),
             RandGaussianNoised(keys=["image"], std=0.01, prob=0.15),
             RandGaussianSmoothd(
                 keys=["image"],
@@ -331,6 +470,8 @@ def run_training(train_file_list, valid_file_list, config_info):
             ),
             RandScaleIntensityd(keys=["image"], factors=0.3, prob=0.15),
             RandFlipd(["image", "label"], spatial_axis=[0, 1], prob=0.5),
+        ] if batch_augment is None else [])
+        + [
             ToTensord(keys=["image", "label"]),
         ]
     )
@@ -346,7 +487,7 @@ def run_training(train_file_list, valid_file_list, config_info):
     # NOTE: The validation data is kept 3D as a 2D sliding window approach is used throughout the volume at inference
     val_transforms = Compose(
         [
-            LoadNiftid(keys=["image", "label"]),
+            LoadNiftiMMapd(keys=["image", "label"]),
             AddChanneld(keys=["image", "label"]),
             CropForegroundd(keys=["image", "label"], source_key="image"),
             InPlaneSpacingd(
@@ -361,28 +502,102 @@ def run_training(train_file_list, valid_file_list, config_info):
     )
 
     """
-    Load data 
+    Load data
     """
+    # common loader settings: pin host memory (so host-to-device copies can run asynchronously) and
+    # keep the workers alive across epochs to avoid paying the worker start-up cost at every epoch.
+    # The loaders are built directly on torch.utils.data.DataLoader (with MONAI's collate and
+    # worker-init functions) because the monai.data.DataLoader wrapper in 0.3.0 has a fixed
+    # keyword list and does not accept persistent_workers/prefetch_factor
+    num_workers = config_info['device']['num_workers']
+    dataloader_kwargs = {'num_workers': num_workers, 'pin_memory': torch.cuda.is_available(),
+                         'collate_fn': list_data_collate, 'worker_init_fn': worker_init_fn}
+    if num_workers > 0:
+        dataloader_kwargs['persistent_workers'] = True
+        dataloader_kwargs['prefetch_factor'] = config_info['device'].get('prefetch_factor', 4)
+
+    # create the training and validation datasets
+    # the deterministic preprocessing (up to the first random transform) is cached, either on disk
+    # (cache_type: persistent) or in RAM (cache_type: memory), so it is not recomputed at every epoch.
+    # The in-memory cache avoids re-reading the cached tensors from disk, provided the dataset fits in RAM.
+    cache_type = config_info['device'].get('cache_type', 'persistent')
+    if cache_type == 'memory':
+        cache_rate = config_info['device'].get('cache_rate', 1.0)
+        train_ds = CacheDataset(data=train_files, transform=train_transforms,
+                                cache_rate=cache_rate, num_workers=num_workers)
+        val_ds = CacheDataset(data=val_files, transform=val_transforms,
+                              cache_rate=cache_rate, num_workers=num_workers)
+    elif cache_type == 'persistent':
+        # the cache keys are precomputed once and also encode the deterministic preprocessing
+        # settings, so caches for different spacings/patch sizes can share a directory
+        preprocess_key = {'spacing': spacing, 'patch_size': patch_size}
+        train_ds = HashKeyedPersistentDataset(data=train_files, transform=train_transforms,
+                                              cache_dir=persistent_cache, cache_key=preprocess_key)
+        val_ds = HashKeyedPersistentDataset(data=val_files, transform=val_transforms,
+                                            cache_dir=persistent_cache, cache_key=preprocess_key)
+    elif cache_type == 'hybrid':
+        # on-disk persistent cache for reuse across runs, plus per-process memoization in RAM
+        # so samples are deserialized from disk only once per run
+        train_ds = InMemoryPersistentDataset(data=train_files, transform=train_transforms,
+                                             cache_dir=persistent_cache)
+        val_ds = InMemoryPersistentDataset(data=val_files, transform=val_transforms,
+                                           cache_dir=persistent_cache)
+    else:
+        raise ValueError("Unrecognized cache_type: {}, available options are "
+                         "['persistent', 'memory', 'hybrid']".format(cache_type))
+
+    # optionally populate the persistent cache upfront with a parallel pass over the datasets,
+    # so the first training epoch does not pay the serial preprocess-and-write cost per sample
+    cache_warmup_workers = config_info['device'].get('cache_warmup_workers', 0)
+    if cache_type == 'persistent' and cache_warmup_workers > 0:
+        print("Pre-populating the persistent cache with {} workers...".format(cache_warmup_workers))
+        for warmup_ds in (train_ds, val_ds):
+            warmup_loader = DataLoader(warmup_ds, batch_size=1, shuffle=False,
+                                       num_workers=cache_warmup_workers,
+                                       collate_fn=list_data_collate, worker_init_fn=worker_init_fn)
+            for _ in warmup_loader:
+                pass
+
+    # optionally ask the OS to read the upcoming volumes into the page cache ahead of use;
+    # mainly helps the first (cold-cache) epoch and networked filesystems
+    file_readahead = config_info['device'].get('file_readahead', 0)
+    if file_readahead > 0:
+        print("Prefetching input files with a readahead of {} items".format(file_readahead))
+        train_ds = RollingPrefetchDataset(train_ds, train_files, lookahead=file_readahead)
+        val_ds = RollingPrefetchDataset(val_ds, val_files, lookahead=file_readahead)
+
+    # experimental: record the augmented patches of the first epoch in memory-mapped banks and
+    # replay them in later epochs, trading augmentation diversity for raw throughput (meant for
+    # I/O-bound profiling runs with num_workers=0, not for training final models)
+    if config_info['device'].get('patch_bank', False):
+        if num_workers > 0:
+            # each forked worker would truncate and refill the shared bank files behind the
+            # others' backs, silently corrupting the replayed patches
+            print("WARNING: patch_bank requires num_workers=0 (each dataloader worker would "
+                  "corrupt the shared bank files); ignoring the patch_bank setting")
+        else:
+            print("Replaying first-epoch training patches from a memory-mapped bank")
+            train_ds = PatchBankDataset(train_ds, persistent_cache)
+
     # create training data loader
-    train_ds = PersistentDataset(data=train_files, transform=train_transforms,
-                                 cache_dir=persistent_cache)
     train_loader = DataLoader(train_ds,
                               batch_size=config_info['training']['batch_size_train'],
                               shuffle=True,
-                              num_workers=config_info['device']['num_workers'])
-    check_train_data = misc.first(train_loader)
-    print("Training data tensor shapes:")
+                              **dataloader_kwargs)
+    # sanity-check the shapes on a single sample: indexing the dataset directly avoids spinning
+    # up (and tearing down) the whole worker pool for one throwaway batch before training starts
+    check_train_data = train_ds[0]
+    print("Training data tensor shapes (example):")
     print("Image = {}; Label = {}".format(check_train_data["image"].shape, check_train_data["label"].shape))
 
     # create validation data loader
     if config_info['training']['batch_size_valid'] != 1:
         raise Exception("Batch size different from 1 at validation ar currently not supported")
-    val_ds = PersistentDataset(data=val_files, transform=val_transforms, cache_dir=persistent_cache)
     val_loader = DataLoader(val_ds,
                             batch_size=1,
                             shuffle=False,
-                            num_workers=config_info['device']['num_workers'])
-    check_valid_data = misc.first(val_loader)
+                            **dataloader_kwargs)
+    check_valid_data = val_ds[0]
     print("Validation data tensor shapes (Example):")
     print("Image = {}; Label = {}\n".format(check_valid_data["image"].shape, check_valid_data["label"].shape))
 
@@ -395,18 +610,36 @@ def run_training(train_file_list, valid_file_list, config_info):
     sizes = patch_size[:2]
     strides, kernels = [], []
     while True:
-        spacing_ratio = [sp / min(spacings) for sp in spacings]
+        min_spacing = min(spacings)
+        spacing_ratio = [sp / min_spacing for sp in spacings]
         stride = [2 if ratio <= 2 and size >= 8 else 1 for (ratio, size) in zip(spacing_ratio, sizes)]
         kernel = [3 if ratio <= 2 else 1 for ratio in spacing_ratio]
         if all(s == 1 for s in stride):
             break
-        sizes = [i / j for i, j in zip(sizes, stride)]
+        # the strides are powers of two, so integer division keeps the sizes exact (no float drift)
+        sizes = [i // j for i, j in zip(sizes, stride)]
         spacings = [i * j for i, j in zip(spacings, stride)]
         kernels.append(kernel)
         strides.append(stride)
     strides.insert(0, len(spacings) * [1])
     kernels.append(len(spacings) * [3])
 
+    # the spatial sizes of the deep-supervision outputs are fixed by the patch size and the
+    # strides, so the downsampled label sizes can be derived once here rather than from the
+    # prediction shapes at every training iteration
+    deep_supr_num = 2
+    ds_sizes = []
+    level_size = patch_size[:2]
+    for stride in strides[1:1 + deep_supr_num]:
+        # DynUNet's padded stride-2 convolutions produce ceil(size / stride) feature maps, so
+        # the sizes are derived with ceiling division to match the prediction shapes exactly
+        # even when the patch size is not divisible by the cumulative stride
+        level_size = [(i + j - 1) // j for i, j in zip(level_size, stride)]
+        ds_sizes.append(tuple(level_size))
+    # exponentially decaying weights for the deep-supervision loss terms, built once on device
+    ds_loss_weights = torch.tensor([0.5 ** i for i in range(deep_supr_num + 1)],
+                                   device=current_device)
+
     # initialise the network
     net = DynUNet(
         spatial_dims=2,
@@ -417,19 +650,49 @@ def run_training(train_file_list, valid_file_list, config_info):
         upsample_kernel_size=strides[1:],
         norm_name="instance",
         deep_supervision=True,
-        deep_supr_num=2,
+        deep_supr_num=deep_supr_num,
         res_block=False,
     ).to(current_device)
     print(net)
 
+    # store weights and activations in channels-last layout so cuDNN can pick NHWC
+    # tensor-core kernels for the 2D convolutions (pairs well with AMP)
+    use_channels_last = (config_info['training'].get('channels_last', True)
+                         and torch.cuda.is_available() and hasattr(torch, 'channels_last'))
+    if use_channels_last:
+        print("Using channels-last memory format for the network")
+        net = net.to(memory_format=torch.channels_last)
+
+    # optionally compile the network forward, specialising it for the fixed patch shape
+    # (requires PyTorch >= 2.0, silently skipped otherwise); the checkpoint handlers keep
+    # referencing the raw module so saved/loaded models stay compatible
+    model = net
+    if config_info['device'].get('compile_model', False) and hasattr(torch, 'compile'):
+        print("Compiling the network with torch.compile")
+        model = torch.compile(net, mode='reduce-overhead')
+
     # define the loss function
     loss_function = choose_loss_function(nr_out_channels, config_info)
 
-    # define the optimiser and the learning rate scheduler
-    opt = torch.optim.SGD(net.parameters(), lr=float(config_info['training']['lr']), momentum=0.95)
-    scheduler = torch.optim.lr_scheduler.LambdaLR(
-        opt, lr_lambda=lambda epoch: (1 - epoch / config_info['training']['nr_train_epochs']) ** 0.9
-    )
+    # define the optimiser and the learning rate scheduler, preferring the fused single-kernel
+    # SGD and the native polynomial decay when the installed torch provides them
+    lr = float(config_info['training']['lr'])
+    if torch.cuda.is_available():
+        try:
+            # fused=True updates all parameter tensors in one kernel instead of one per tensor
+            opt = torch.optim.SGD(net.parameters(), lr=lr, momentum=0.95, fused=True)
+        except (TypeError, RuntimeError):
+            opt = torch.optim.SGD(net.parameters(), lr=lr, momentum=0.95)
+    else:
+        opt = torch.optim.SGD(net.parameters(), lr=lr, momentum=0.95)
+    if hasattr(torch.optim.lr_scheduler, 'PolynomialLR'):
+        scheduler = torch.optim.lr_scheduler.PolynomialLR(
+            opt, total_iters=config_info['training']['nr_train_epochs'], power=0.9
+        )
+    else:
+        scheduler = torch.optim.lr_scheduler.LambdaLR(
+            opt, lr_lambda=lambda epoch: (1 - epoch / config_info['training']['nr_train_epochs']) ** 0.9
+        )
 
     """
     MONAI evaluator
@@ -457,24 +720,33 @@ def run_training(train_file_list, valid_file_list, config_info):
     class DynUNetEvaluator(SupervisedEvaluator):
         def _iteration(self, engine, batchdata):
             inputs, targets = self.prepare_batch(batchdata)
-            inputs, targets = inputs.to(engine.state.device), targets.to(engine.state.device)
-            flip_inputs_1 = torch.flip(inputs, dims=(2,))
-            flip_inputs_2 = torch.flip(inputs, dims=(3,))
-            flip_inputs_3 = torch.flip(inputs, dims=(2, 3))
+            # non_blocking copies overlap with GPU compute when the loader uses pinned memory
+            inputs = inputs.to(engine.state.device, non_blocking=True)
+            targets = targets.to(engine.state.device, non_blocking=True)
 
             def _compute_pred():
-                pred = self.inferer(inputs, self.network)
-                # use random flipping as data augmentation at inference
-                flip_pred_1 = torch.flip(self.inferer(flip_inputs_1, self.network), dims=(2,))
-                flip_pred_2 = torch.flip(self.inferer(flip_inputs_2, self.network), dims=(3,))
-                flip_pred_3 = torch.flip(self.inferer(flip_inputs_3, self.network), dims=(2, 3))
-                return (pred + flip_pred_1 + flip_pred_2 + flip_pred_3) / 4
+                # use flipping as data augmentation at inference: stack the original and the three
+                # flipped orientations along the batch dimension so a single sliding-window sweep
+                # covers all of them, then undo the flips on the predictions and average
+                stacked = torch.cat([inputs,
+                                     torch.flip(inputs, dims=(2,)),
+                                     torch.flip(inputs, dims=(3,)),
+                                     torch.flip(inputs, dims=(2, 3))], dim=0)
+                pred, flip_pred_1, flip_pred_2, flip_pred_3 = torch.chunk(
+                    self.inferer(stacked, self.network), 4, dim=0)
+                # accumulate the un-flipped predictions in place (into the first chunk of the
+                # inferer output) rather than materialising intermediate sums
+                pred += torch.flip(flip_pred_1, dims=(2,))
+                pred += torch.flip(flip_pred_2, dims=(3,))
+                pred += torch.flip(flip_pred_3, dims=(2, 3))
+                pred /= 4
+                return pred
 
             # execute forward computation
             self.network.eval()
             with torch.no_grad():
                 if self.amp:
-                    with torch.cuda.amp.autocast():
+                    with autocast_region():
                         predictions = _compute_pred()
                 else:
                     predictions = _compute_pred()
@@ -483,8 +755,9 @@ def run_training(train_file_list, valid_file_list, config_info):
     evaluator = DynUNetEvaluator(
         device=current_device,
         val_data_loader=val_loader,
-        network=net,
-        inferer=SlidingWindowInferer2D(roi_size=patch_size, sw_batch_size=4, overlap=0.0),
+        network=model,
+        inferer=SlidingWindowInferer2D(roi_size=patch_size, sw_batch_size=4, overlap=0.0,
+                                       channels_last=use_channels_last),
         post_transform=None,
         key_val_metric={
             "Mean_dice": MeanDice(
@@ -495,7 +768,7 @@ def run_training(train_file_list, valid_file_list, config_info):
             )
         },
         val_handlers=val_handlers,
-        amp=False,
+        amp=use_amp,
     )
 
     """
@@ -534,24 +807,46 @@ def run_training(train_file_list, valid_file_list, config_info):
     class DynUNetTrainer(SupervisedTrainer):
         def _iteration(self, engine, batchdata):
             inputs, targets = self.prepare_batch(batchdata)
-            inputs, targets = inputs.to(engine.state.device), targets.to(engine.state.device)
-
-            def _compute_loss(preds, label):
-                labels = [label] + [interpolate(label, pred.shape[2:]) for pred in preds[1:]]
-                return sum([0.5 ** i * self.loss_function(p, l) for i, (p, l) in enumerate(zip(preds, labels))])
+            # non_blocking copies overlap with GPU compute when the loader uses pinned memory
+            inputs = inputs.to(engine.state.device, non_blocking=True)
+            targets = targets.to(engine.state.device, non_blocking=True)
+            if use_channels_last:
+                inputs = inputs.to(memory_format=torch.channels_last)
+
+            # apply the random augmentations to the whole batch on the GPU if so configured
+            if batch_augment is not None:
+                with torch.no_grad():
+                    inputs, targets = batch_augment(inputs, targets)
+
+            # downsample the labels once per batch to the precomputed deep-supervision sizes
+            labels_pyramid = [targets] + [interpolate(targets, size=s) for s in ds_sizes]
+
+            def _compute_loss(preds):
+                # stack the per-level losses and reduce with one weighted sum instead of a
+                # chain of scalar-weighted additions
+                losses = torch.stack([self.loss_function(p, l)
+                                      for p, l in zip(preds, labels_pyramid)])
+                return (losses * ds_loss_weights).sum()
 
             self.network.train()
             self.optimizer.zero_grad()
-            if self.amp and self.scaler is not None:
-                with torch.cuda.amp.autocast():
+            if self.amp and self.scaler is not None and amp_dtype == 'float16':
+                with autocast_region():
                     predictions = self.inferer(inputs, self.network)
-                    loss = _compute_loss(predictions, targets)
+                    loss = _compute_loss(predictions)
                 self.scaler.scale(loss).backward()
                 self.scaler.step(self.optimizer)
                 self.scaler.update()
+            elif self.amp:
+                # bfloat16 has the same exponent range as float32, so no gradient scaling needed
+                with autocast_region():
+                    predictions = self.inferer(inputs, self.network)
+                    loss = _compute_loss(predictions)
+                loss.backward()
+                self.optimizer.step()
             else:
                 predictions = self.inferer(inputs, self.network)
-                loss = _compute_loss(predictions, targets).mean()
+                loss = _compute_loss(predictions).mean()
                 loss.backward()
                 self.optimizer.step()
             return {"image": inputs, "label": targets, "pred": predictions, "loss": loss.item()}
@@ -560,14 +855,14 @@ def run_training(train_file_list, valid_file_list, config_info):
         device=current_device,
         max_epochs=config_info['training']['nr_train_epochs'],
         train_data_loader=train_loader,
-        network=net,
+        network=model,
         optimizer=opt,
         loss_function=loss_function,
         inferer=SimpleInferer(),
         post_transform=None,
         key_train_metric=None,
         train_handlers=train_handlers,
-        amp=False,
+        amp=use_amp,
     )
 
     """
@@ -579,6 +874,8 @@ def run_training(train_file_list, valid_file_list, config_info):
 
 
 if __name__ == "__main__":
+    # argparse is only needed when running as a script, keep it off the import path
+    import argparse
 
     parser = argparse.ArgumentParser(description='Run training with dynUnet with MONAI.')
     parser.add_argument('--train_files_list',
@@ -632,29 +929,29 @@ if __name__ == "__main__":
                         default=None)
     args = parser.parse_args()
 
-    # check existence of filenames listing the input data
-    if not os.path.isfile(args.train_files_list) or os.path.getsize(args.train_files_list) == 0:
+    # check existence of the filenames listing the input data; the two stats are independent,
+    # so overlap them (each can be a full roundtrip on networked filesystems)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        train_size, valid_size = executor.map(_stat_file, [args.train_files_list, args.valid_files_list])
+    if train_size <= 0:
         raise FileNotFoundError('Expected training file {} not found or empty'.format(args.train_files_list))
-    if not os.path.isfile(args.valid_files_list) or os.path.getsize(args.valid_files_list) == 0:
+    if valid_size <= 0:
         raise FileNotFoundError('Expected validation file {} not found or empty'.format(args.valid_files_list))
 
     # check existence of config file and read it
     config_file = args.config_file
     if config_file is None:
-        config_file = os.path.join(*[os.path.dirname(monaifbs.__file__),
-                                     "config", "monai_dynUnet_training_config.yml"])
-    if not os.path.isfile(config_file):
+        config_file = monaifbs.resource_path("config", "monai_dynUnet_training_config.yml")
+    if _stat_file(config_file) < 0:
         raise FileNotFoundError('Expected config file: {} not found'.format(config_file))
-    with open(config_file) as f:
-        print("*** Config file")
-        print(config_file)
-        config = yaml.load(f, Loader=yaml.FullLoader)
+    print("*** Config file")
+    print(config_file)
+    config = load_config_file(config_file)
 
     # add the output directory to the config dictionary
     config['output']['out_postfix'] = args.out_postfix
     config['output']['out_dir'] = args.out_folder
-    if not os.path.exists(config['output']['out_dir']):
-        os.makedirs(config['output']['out_dir'])
+    os.makedirs(config['output']['out_dir'], exist_ok=True)
     if args.cache_dir is not None:
         config['output']['cache_dir'] = args.cache_dir
 
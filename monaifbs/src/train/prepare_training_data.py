@@ -0,0 +1,170 @@
+# Copyright 2020 Marta Bianca Maria Ranzini and contributors
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+##
+# \file       prepare_training_data.py
+# \brief      Script to run the deterministic preprocessing of the training data once, offline,
+#               and store the result as uncompressed Nifti volumes with reduced dtypes.
+#               Training runs pointed at the generated file list skip the gzip decoding and the
+#               in-plane resampling at every epoch, and move fewer bytes through the I/O path
+#               (labels are stored as uint8).
+#
+# \author     Marta B M Ranzini (marta.ranzini@kcl.ac.uk)
+# \date       November 2020
+
+import os
+
+import monaifbs
+from monaifbs.src.train.monai_dynunet_training import (
+    _stat_file,
+    create_data_list_of_dictionaries,
+    load_config_file,
+)
+
+
+def run_preprocessing(files_list, out_folder, config_info):
+    """
+    Apply the deterministic preprocessing of the training pipeline (load, foreground crop,
+    in-plane resampling, padding) to every image-label pair in files_list and save the results
+    as uncompressed .nii volumes in out_folder (images as float32, since NIfTI-1 has no 16-bit
+    float type, labels as uint8). The intensity normalisation is deliberately left to the
+    online pipeline: whitening here would turn the zero background negative and make the
+    training-time CropForegroundd (which selects x > 0) crop a tighter box on the second pass,
+    discarding boundary tissue. With the background kept at zero the online crop is idempotent
+    on the stored volumes, and the whitening is cached online anyway. A new two-column file
+    list pointing at the preprocessed volumes is written to
+    out_folder/preprocessed_files_list.txt, to be passed to monai_dynunet_training.py in place
+    of the original one.
+    Args:
+        files_list: .txt or .csv file (with no header) storing two-columns filenames:
+            image filename in the first column and segmentation filename in the second column.
+            The two columns should be separated by a comma.
+        out_folder: str, directory where to store the preprocessed volumes and the new file list
+        config_info: dict, contains configuration parameters for sampling, network and training.
+            See monaifbs/config/monai_dynUnet_training_config.yml for an example of the expected fields.
+    """
+    import nibabel as nib
+    import numpy as np
+    from monai.transforms import (
+        Compose,
+        AddChanneld,
+        CastToTyped,
+        CropForegroundd,
+        SpatialPadd,
+    )
+
+    from monaifbs.src.utils.custom_transform import InPlaneSpacingd, LoadNiftiMMapd
+
+    data_list = create_data_list_of_dictionaries(files_list)
+    print("Preprocessing {} image-label pairs".format(len(data_list)))
+
+    spacing = config_info["training"]["spacing"]
+    patch_size = config_info["training"]["inplane_size"] + [1]
+
+    # same deterministic chain as the training pipeline up to (and excluding) the whitening,
+    # with the reduced dtypes applied at the end; keeping the background at zero means the
+    # training-time CropForegroundd finds the same bounding box again on the stored volumes
+    preprocess = Compose(
+        [
+            LoadNiftiMMapd(keys=["image", "label"]),
+            AddChanneld(keys=["image", "label"]),
+            CropForegroundd(keys=["image", "label"], source_key="image"),
+            InPlaneSpacingd(
+                keys=["image", "label"],
+                pixdim=spacing,
+                mode=("bilinear", "nearest"),
+            ),
+            SpatialPadd(keys=["image", "label"], spatial_size=patch_size, mode=["constant", "edge"]),
+            CastToTyped(keys=["image", "label"], dtype=(np.float32, np.uint8)),
+        ]
+    )
+
+    out_img_dir = os.path.join(out_folder, 'images')
+    out_seg_dir = os.path.join(out_folder, 'labels')
+    os.makedirs(out_img_dir, exist_ok=True)
+    os.makedirs(out_seg_dir, exist_ok=True)
+
+    def strip_nii_ext(filename):
+        basename = os.path.basename(filename)
+        for ext in ('.nii.gz', '.nii'):
+            if basename.endswith(ext):
+                return basename[:-len(ext)]
+        return basename
+
+    new_list = []
+    for idx, current_pair in enumerate(data_list):
+        data = preprocess(current_pair)
+        out_pair = []
+        for key, out_dir in (("image", out_img_dir), ("label", out_seg_dir)):
+            affine = data["{}_meta_dict".format(key)]["affine"]
+            # drop the channel dimension added for MONAI and save uncompressed
+            volume = np.squeeze(data[key], axis=0)
+            out_name = os.path.join(out_dir, strip_nii_ext(current_pair[key]) + '.nii')
+            nib.save(nib.Nifti1Image(volume, affine), out_name)
+            out_pair.append(out_name)
+        new_list.append(out_pair)
+        print("[{}/{}] {}".format(idx + 1, len(data_list), out_pair[0]))
+
+    out_files_list = os.path.join(out_folder, 'preprocessed_files_list.txt')
+    with open(out_files_list, 'w') as f:
+        f.write('\n'.join('{},{}'.format(img, seg) for img, seg in new_list) + '\n')
+    print("Preprocessed file list saved to {}".format(out_files_list))
+    return out_files_list
+
+
+if __name__ == "__main__":
+    # argparse is only needed when running as a script, keep it off the import path
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the deterministic preprocessing of the training data once, '
+                                                 'storing the result as uncompressed Nifti volumes.')
+    parser.add_argument('--files_list',
+                        dest='files_list',
+                        metavar='/path/to/files_list.txt',
+                        type=str,
+                        help='two-column .txt or .csv file (with no header) containing image filenames and associated '
+                             'label filenames to preprocess (image-label filenames should be comma separated). '
+                             'Expected format of each line:'
+                             '/path/to/image.nii.gz,/path/to/label.nii.gz',
+                        required=True)
+    parser.add_argument('--out_folder',
+                        dest='out_folder',
+                        metavar='/path/to/out_folder',
+                        type=str,
+                        help='directory where to store the preprocessed volumes and the new file list',
+                        required=True)
+    parser.add_argument('--config_file',
+                        dest='config_file',
+                        metavar='/path/to/config_file.yml',
+                        type=str,
+                        help='config file with the spacing and patch size to preprocess for. '
+                             'The file monaifbs/config/monai_dynUnet_training_config.yml is used by default',
+                        default=None)
+    args = parser.parse_args()
+
+    # check existence of the file listing the input data
+    if _stat_file(args.files_list) <= 0:
+        raise FileNotFoundError('Expected file {} not found or empty'.format(args.files_list))
+
+    # check existence of config file and read it
+    config_file = args.config_file
+    if config_file is None:
+        config_file = monaifbs.resource_path("config", "monai_dynUnet_training_config.yml")
+    if _stat_file(config_file) < 0:
+        raise FileNotFoundError('Expected config file: {} not found'.format(config_file))
+    print("*** Config file")
+    print(config_file)
+    config = load_config_file(config_file)
+
+    os.makedirs(args.out_folder, exist_ok=True)
+
+    # run the one-off preprocessing
+    run_preprocessing(args.files_list, args.out_folder, config)
@@ -20,12 +20,14 @@
 # \date       November 2020
 
 import copy
+import itertools
 import torch
+import torch.nn.functional as F
 from typing import Union
 
 from monai.inferers.utils import sliding_window_inference
 from monai.inferers import Inferer
-from monai.utils import BlendMode
+from monai.utils import BlendMode, fall_back_tuple
 
 
 class Predict2DFrom3D:
@@ -33,10 +35,14 @@ class Predict2DFrom3D:
     Crop 2D slices from 3D inputs and perform 2D predictions.
     Args:
         predictor (Network): trained network to perform the prediction
+        channels_last (bool): if True, bring the squeezed 2D slices to channels-last (NHWC)
+            memory format before the forward pass, matching a network stored in that layout
     """
     def __init__(self,
-                 predictor):
+                 predictor,
+                 channels_last=False):
         self.predictor = predictor
+        self.channels_last = channels_last
 
     def __call__(self, data):
         """
@@ -52,6 +58,8 @@ class Predict2DFrom3D:
         for idx_dim in range(2, 2+len(data_size)):
             if data_size[idx_dim-2] == 1:
                 data = torch.squeeze(data, dim=idx_dim)
+        if self.channels_last and data.dim() == 4:
+            data = data.contiguous(memory_format=torch.channels_last)
         predictions = self.predictor(data)  # batched patch segmentation
         new_size = copy.deepcopy(orig_size)
         new_size[1] = predictions.shape[1]   # keep original data shape, but take channel dimension from the prediction
@@ -80,6 +88,8 @@ class SlidingWindowInferer2D(Inferer):
 
             - ``"constant``": gives equal weight to all predictions.
             - ``"gaussian``": gives less weight to predictions on edges of windows.
+        channels_last: if True, run the 2D forward passes in channels-last (NHWC) memory format,
+            to match a network whose weights are stored in that layout.
 
     Note:
         the "sw_batch_size" here is to run a batch of window slices of 1 input image,
@@ -88,13 +98,15 @@ class SlidingWindowInferer2D(Inferer):
     """
 
     def __init__(
-        self, roi_size, sw_batch_size: int = 1, overlap: float = 0.25, mode: Union[BlendMode, str] = BlendMode.CONSTANT
+        self, roi_size, sw_batch_size: int = 1, overlap: float = 0.25,
+        mode: Union[BlendMode, str] = BlendMode.CONSTANT, channels_last: bool = False
     ):
         Inferer.__init__(self)
         self.roi_size = roi_size
         self.sw_batch_size = sw_batch_size
         self.overlap = overlap
         self.mode: BlendMode = BlendMode(mode)
+        self.channels_last = channels_last
 
     def __call__(self, inputs: torch.Tensor, network):
         """
@@ -106,10 +118,86 @@ class SlidingWindowInferer2D(Inferer):
 
         """
         # convert the network to a callable that squeezes 3D slices to 2D before performing the network prediction
-        predictor_2d = Predict2DFrom3D(network)
+        predictor_2d = Predict2DFrom3D(network, channels_last=self.channels_last)
+        if self.overlap == 0.0 and self.mode == BlendMode.CONSTANT:
+            return self._disjoint_window_inference(inputs, predictor_2d)
+        # sliding_window_inference in MONAI 0.3.0 only supports a batch size of 1, so larger
+        # batches (e.g. the stacked test-time-augmentation orientations) are run item by item
+        if inputs.shape[0] > 1:
+            return torch.cat([sliding_window_inference(inputs[i:i + 1], self.roi_size,
+                                                       self.sw_batch_size, predictor_2d,
+                                                       self.overlap, self.mode)
+                              for i in range(inputs.shape[0])], dim=0)
         return sliding_window_inference(inputs, self.roi_size, self.sw_batch_size,
                                         predictor_2d, self.overlap, self.mode)
 
+    def _disjoint_window_inference(self, inputs: torch.Tensor, predictor):
+        """
+        Fast path for overlap=0 with constant blending: the scan positions cover disjoint slabs,
+        so each window prediction is accumulated straight into one preallocated output volume,
+        avoiding the per-window importance map and the full-volume count-map division of the
+        generic sliding_window_inference.
+        Windows at the borders are shifted back inside the volume as in the generic
+        implementation; where shifted windows overlap, the predictions are averaged by halving
+        the narrow border band along each non-divisible dimension, which matches the constant
+        blending of the generic implementation exactly (positions covered along several
+        dimensions at once are halved once per dimension).
+
+        Args:
+            inputs (torch.tensor): model input data for inference.
+            predictor (callable): callable performing the prediction on each window.
+        """
+        num_spatial_dims = len(inputs.shape) - 2
+        orig_size = list(inputs.shape[2:])
+        roi_size = fall_back_tuple(self.roi_size, orig_size)
+
+        # pad the input so that every spatial dimension fits at least one window
+        image_size = tuple(max(orig_size[i], roi_size[i]) for i in range(num_spatial_dims))
+        pad_size = []
+        for k in range(len(inputs.shape) - 1, 1, -1):
+            diff = max(roi_size[k - 2] - inputs.shape[k], 0)
+            half = diff // 2
+            pad_size.extend([half, diff - half])
+        if any(pad_size):
+            inputs = F.pad(inputs, pad=pad_size, mode="constant", value=0.0)
+
+        # disjoint scan positions along each spatial dimension (last window shifted back inside)
+        starts_per_dim = []
+        for dim in range(num_spatial_dims):
+            starts = [min(st, image_size[dim] - roi_size[dim])
+                      for st in range(0, image_size[dim], roi_size[dim])]
+            starts_per_dim.append(starts)
+
+        # each window is run for the whole input batch at once and accumulated into the output
+        output = None
+        for window_start in itertools.product(*starts_per_dim):
+            window_slices = (slice(None), slice(None)) + tuple(
+                slice(st, st + roi_size[dim]) for dim, st in enumerate(window_start))
+            pred = predictor(inputs[window_slices])
+            if output is None:
+                output = torch.zeros((inputs.shape[0], pred.shape[1]) + image_size,
+                                     dtype=pred.dtype, device=pred.device)
+            output[window_slices] += pred
+
+        # average the bands where the shifted border window overlaps the regular grid: a
+        # position overlapped along k dimensions received 2**k predictions, so halving the
+        # band of each non-divisible dimension in turn divides it by exactly that count
+        for dim in range(num_spatial_dims):
+            if image_size[dim] % roi_size[dim] != 0 and image_size[dim] > roi_size[dim]:
+                band = (slice(None), slice(None)) + tuple(
+                    slice(image_size[dim] - roi_size[dim], (image_size[dim] // roi_size[dim]) * roi_size[dim])
+                    if d == dim else slice(None) for d in range(num_spatial_dims))
+                output[band] /= 2
+
+        # remove the padding, if any was applied
+        if any(pad_size):
+            crop_slices = [slice(None), slice(None)]
+            for dim in range(num_spatial_dims):
+                half = max(roi_size[dim] - orig_size[dim], 0) // 2
+                crop_slices.append(slice(half, half + orig_size[dim]))
+            output = output[tuple(crop_slices)]
+        return output
+
 
 class SlidingWindowInferer2DWithResize(Inferer):
     """
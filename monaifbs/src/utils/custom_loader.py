@@ -0,0 +1,214 @@
+# Copyright 2020 Marta Bianca Maria Ranzini and contributors
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+##
+# \file       custom_loader.py
+# \brief      contains custom data-loading utilities to speed up the training pipeline, such as
+#               persistent-cache dataset variants with cheaper cache-key handling.
+#
+# \author     Marta B M Ranzini (marta.ranzini@kcl.ac.uk)
+# \date       November 2020
+
+import copy
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from monai.data import PersistentDataset
+
+
+class HashKeyedPersistentDataset(PersistentDataset):
+    """
+    PersistentDataset variant that computes the per-item cache filenames once at construction
+    instead of re-hashing the item dict on every single access, and mixes a caller-provided
+    description of the deterministic preprocessing (e.g. spacing and patch size) into the keys,
+    so runs with different preprocessing settings can share one cache_dir without collisions.
+    The caching logic itself is adapted from the MONAI class PersistentDataset
+    https://github.com/Project-MONAI/MONAI/blob/releases/0.3.0/monai/data/dataset.py
+    Args:
+        data: list of dicts, input data to load and transform to generate dataset for model
+        transform: transforms to execute operations on input data
+        cache_dir: str or Path, directory where the persistent cache is stored
+        cache_key: optional json-serializable object describing the deterministic part of the
+            transform pipeline, hashed into the cache filenames
+    """
+
+    def __init__(self, data, transform, cache_dir, cache_key=None):
+        super(HashKeyedPersistentDataset, self).__init__(data=data, transform=transform, cache_dir=cache_dir)
+        key_suffix = ''
+        if cache_key is not None:
+            key_suffix = '_' + hashlib.blake2b(json.dumps(cache_key, sort_keys=True).encode('utf-8'),
+                                               digest_size=8).hexdigest()
+        self._hashfiles = []
+        for item in self.data:
+            if self.cache_dir is None:
+                self._hashfiles.append(None)
+            else:
+                item_md5 = hashlib.md5(json.dumps(item, sort_keys=True).encode('utf-8')).hexdigest()
+                self._hashfiles.append(self.cache_dir / '{}{}.pt'.format(item_md5, key_suffix))
+
+    def _cachecheck_precomputed(self, item_transformed, hashfile):
+        # same logic as PersistentDataset._pre_first_random_cachecheck in MONAI 0.3.0, with the
+        # cache filename taken from the precomputed list instead of hashed per access
+        if item_transformed.get("cached", False) is False:
+            if hashfile is not None and hashfile.is_file():
+                item_transformed = torch.load(hashfile)
+            else:
+                item_transformed = self._pre_first_random_transform(item_transformed)
+                if hashfile is not None:
+                    # sentinel flag plus write-then-rename, as in the upstream implementation,
+                    # to keep the cache robust against killed parent processes
+                    item_transformed["cached"] = True
+                    temp_hash_file = hashfile.with_suffix(".temp_write_cache")
+                    torch.save(item_transformed, temp_hash_file)
+                    temp_hash_file.rename(hashfile)
+        return item_transformed
+
+    def __getitem__(self, index):
+        pre_random_item = self._cachecheck_precomputed(self.data[index], self._hashfiles[index])
+        return self._first_random_and_beyond_transform(pre_random_item)
+
+
+class InMemoryPersistentDataset(PersistentDataset):
+    """
+    PersistentDataset variant that additionally memoizes the deterministically-preprocessed
+    samples in RAM. The first access of an item goes through the on-disk persistent cache
+    (computing and writing it if missing), later accesses in the same process are served from
+    memory without touching the filesystem. This combines the across-runs reuse of the disk
+    cache with the in-RAM speed of CacheDataset, at the cost of holding the preprocessed
+    dataset in memory. Note that with multi-process data loading each worker builds its own
+    in-memory copy.
+    Args:
+        data: list of dicts, input data to load and transform to generate dataset for model
+        transform: transforms to execute operations on input data
+        cache_dir: str or Path, directory where the persistent cache is stored
+    """
+
+    def __init__(self, data, transform, cache_dir):
+        super(InMemoryPersistentDataset, self).__init__(data=data, transform=transform, cache_dir=cache_dir)
+        self._memory_cache = {}
+
+    def _pre_first_random_cachecheck(self, item_transformed):
+        key = str(item_transformed)
+        if key not in self._memory_cache:
+            self._memory_cache[key] = \
+                super(InMemoryPersistentDataset, self)._pre_first_random_cachecheck(item_transformed)
+        # deep-copy so the random transforms applied downstream cannot mutate the cached copy
+        return copy.deepcopy(self._memory_cache[key])
+
+
+class PatchBankDataset:
+    """
+    Dataset wrapper that records the fully-transformed, fixed-shape training patches produced
+    during the first epoch into float16/uint8 memory-mapped banks on disk, and replays them from
+    there afterwards. Serving a replayed patch costs one memmap read and a cast, with no Nifti
+    decoding and no transform execution. Replayed epochs see exactly the same augmented patches
+    as the first one, so augmentation diversity is traded for raw throughput: intended for
+    I/O-bound profiling and debugging runs rather than for training final models. Requires
+    single-process data loading (num_workers=0): each forked worker would otherwise re-open
+    the same bank files in 'w+' mode (truncating data other workers have mapped) and keep its
+    own private fill state, silently corrupting the bank; a RuntimeError is raised when the
+    banks are opened from inside a dataloader worker.
+    Args:
+        dataset: dataset producing fixed-shape {"image", "label"} samples
+        bank_dir: str or Path, directory where the patch banks are stored
+    """
+
+    def __init__(self, dataset, bank_dir):
+        self.dataset = dataset
+        self.bank_dir = str(bank_dir)
+        self._image_bank = None
+        self._label_bank = None
+        self._filled = np.zeros(len(dataset), dtype=bool)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def _open_banks(self, sample):
+        # opening the banks in 'w+' mode truncates existing files, so this must only ever
+        # happen in the main process: forked workers would each truncate and refill the same
+        # files behind each other's backs
+        if torch.utils.data.get_worker_info() is not None:
+            raise RuntimeError("PatchBankDataset requires single-process data loading "
+                               "(num_workers=0), as each dataloader worker would truncate and "
+                               "refill the shared patch bank files")
+        # the bank shapes are only known once the first transformed sample is available
+        self._image_bank = np.lib.format.open_memmap(
+            os.path.join(self.bank_dir, 'patch_bank_images.npy'), mode='w+',
+            dtype=np.float16, shape=(len(self.dataset),) + tuple(sample["image"].shape))
+        self._label_bank = np.lib.format.open_memmap(
+            os.path.join(self.bank_dir, 'patch_bank_labels.npy'), mode='w+',
+            dtype=np.uint8, shape=(len(self.dataset),) + tuple(sample["label"].shape))
+
+    def __getitem__(self, index):
+        if self._image_bank is not None and self._filled[index]:
+            return {"image": torch.as_tensor(np.asarray(self._image_bank[index], dtype=np.float32)),
+                    "label": torch.as_tensor(np.asarray(self._label_bank[index], dtype=np.float32))}
+        sample = self.dataset[index]
+        if self._image_bank is None:
+            self._open_banks(sample)
+        self._image_bank[index] = sample["image"]
+        self._label_bank[index] = sample["label"]
+        self._filled[index] = True
+        return sample
+
+
+class RollingPrefetchDataset:
+    """
+    Dataset wrapper that, on every __getitem__, asks the OS to start reading the files of the
+    next few items into the page cache (posix_fadvise WILLNEED) from a small thread pool, so the
+    storage latency of upcoming volumes overlaps with decoding the current one. Mainly helps the
+    first (cold-cache) epoch and networked filesystems; it is a no-op on platforms without
+    posix_fadvise, and with a shuffling sampler the prefetched items are only an approximation
+    of the actual access order.
+    Args:
+        dataset: dataset serving the items
+        data_list: list of dicts of filenames backing each item, in dataset order
+        lookahead: int, number of upcoming items to prefetch on each access
+    """
+
+    def __init__(self, dataset, data_list, lookahead=2):
+        self.dataset = dataset
+        self.data_list = data_list
+        self.lookahead = lookahead
+        # expose the wrapped dataset's transform so MONAI's worker_init_fn can still reseed
+        # the random transforms per worker (it looks for dataset.transform on the loader's
+        # dataset, which is this wrapper)
+        self.transform = getattr(dataset, "transform", None)
+        # created lazily so the wrapper stays picklable when shipped to dataloader workers
+        self._executor = None
+
+    def __len__(self):
+        return len(self.dataset)
+
+    @staticmethod
+    def _advise(filename):
+        try:
+            fd = os.open(filename, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+    def __getitem__(self, index):
+        if hasattr(os, 'posix_fadvise'):
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=4)
+            for item in self.data_list[index + 1:index + 1 + self.lookahead]:
+                for filename in item.values():
+                    self._executor.submit(self._advise, filename)
+        return self.dataset[index]
@@ -22,7 +22,7 @@
 # \date       November 2020
 
 import warnings
-from typing import Callable, Optional, Union
+from typing import Callable, List, Optional, Union
 
 import torch
 import torch.nn as nn
@@ -32,6 +32,42 @@ from monai.networks.utils import one_hot
 from monai.utils import LossReduction
 
 
+@torch.jit.script
+def fused_dice_ce(input: torch.Tensor, target: torch.Tensor, smooth_num: float, smooth_den: float,
+                  pow: float, batch_version: bool) -> torch.Tensor:
+    """
+    Fused TorchScript implementation of Dice + Cross Entropy for softmax predictions with
+    one-hot-encoded targets. The log-softmax is computed once and shared between the Dice
+    and cross entropy terms, so the logits are streamed through memory a single time instead
+    of once per intermediate op.
+    Args:
+        input: logits, the shape should be BNH[WD] with N > 1.
+        target: label indices, the shape should be B1H[WD].
+        smooth_num: a small constant to be added to the numerator of Dice to avoid nan.
+        smooth_den: a small constant to be added to the denominator of Dice to avoid nan.
+        pow: raise the Dice to the required power.
+        batch_version: if True, a single Dice value is computed for the whole batch per class.
+    Return:
+        scalar loss = Dice^pow + cross entropy.
+    """
+    log_probs = input - torch.logsumexp(input, dim=1, keepdim=True)
+    probs = torch.exp(log_probs)
+    target_idx = target.long()
+    target_one_hot = torch.zeros_like(probs).scatter_(1, target_idx, 1.0)
+
+    reduce_axis: List[int] = []
+    if batch_version:
+        reduce_axis.append(0)
+    for d in range(2, input.dim()):
+        reduce_axis.append(d)
+
+    intersection = torch.sum(target_one_hot * probs, dim=reduce_axis)
+    denominator = torch.sum(target_one_hot, dim=reduce_axis) + torch.sum(probs, dim=reduce_axis)
+    dice = torch.mean((1.0 - (2.0 * intersection + smooth_num) / (denominator + smooth_den)) ** pow)
+    cross_entropy = torch.nn.functional.nll_loss(log_probs, target_idx.squeeze(1))
+    return dice + cross_entropy
+
+
 class DiceLossExtended(_Loss):
     """
     Compute average Dice loss between two tensors. It can support both multi-classes and multi-labels tasks.
@@ -265,6 +301,12 @@ class DiceCELoss(nn.Module):
                                      smooth_num=smooth_num,
                                      smooth_den=smooth_den)
         self.cross_entropy = CrossEntropyLoss()
+        # the default configuration (softmax activation, one-hot target, all channels, mean
+        # reduction) is also implemented by the fused TorchScript kernel fused_dice_ce
+        self.use_fused = (to_onehot_y and softmax and include_background
+                          and not sigmoid and other_act is None
+                          and not squared_pred and not jaccard
+                          and LossReduction(reduction) == LossReduction.MEAN)
 
     def forward(self, y_pred, y_true):
         """
@@ -272,6 +314,9 @@ class DiceCELoss(nn.Module):
             y_pred: the shape should be BNH[WD].
             y_true: the shape should be BNH[WD].
         """
+        if self.use_fused and y_pred.shape[1] > 1:
+            return fused_dice_ce(y_pred, y_true, self.dice.smooth_num, self.dice.smooth_den,
+                                 self.dice.pow, self.dice.batch_version)
         dice = self.dice(y_pred, y_true)
         cross_entropy = self.cross_entropy(y_pred, y_true)
         return dice + cross_entropy
@@ -18,11 +18,14 @@
 
 import numpy as np
 import copy
-from typing import Dict, Hashable, Mapping, Optional, Sequence, Union
+from typing import Dict, Hashable, Mapping, Optional, Sequence, Tuple, Union
+
+import nibabel as nib
+import torch
 
 from monai.config import KeysCollection
 from monai.transforms import (
-    DivisiblePad, MapTransform, Spacing, Spacingd
+    DivisiblePad, MapTransform, RandAffined, Spacing, Spacingd
 )
 from monai.utils import (
     NumpyPadMode,
@@ -103,6 +106,228 @@ class MinimumPadd(MapTransform):
         return d
 
 
+class LoadNiftiMMapd(MapTransform):
+    """
+    Load Nifti images through the nibabel array proxy instead of get_fdata().
+    Reading via the proxy preserves the on-disk dtype (typically int16/uint16) rather than
+    materialising an intermediate float64 volume, and uncompressed .nii files are served from a
+    memory map instead of being fully decoded upfront. The data and meta dictionary layout
+    matches monai.transforms.LoadNiftid (as of MONAI 0.3.0), so this can be used as a drop-in
+    replacement at the start of the processing pipelines.
+    """
+
+    def __init__(self, keys: KeysCollection, dtype: Optional[np.dtype] = np.float32,
+                 meta_key_postfix: str = "meta_dict") -> None:
+        """
+        Args:
+            keys: keys of the corresponding items to be transformed.
+                See also: :py:class:`monai.transforms.compose.MapTransform`
+            dtype: if not None, convert the loaded data to this data type.
+            meta_key_postfix: use `key_{postfix}` to store the meta data of the loaded image,
+                default is `meta_dict`.
+        """
+        super().__init__(keys)
+        self.dtype = dtype
+        self.meta_key_postfix = meta_key_postfix
+
+    def __call__(self, data):
+        d = dict(data)
+        for key in self.keys:
+            img = nib.load(d[key], mmap=True, keep_file_open=True)
+            header = dict(img.header)
+            header["filename_or_obj"] = d[key]
+            header["affine"] = img.affine
+            header["original_affine"] = img.affine.copy()
+            header["as_closest_canonical"] = False
+            header["spatial_shape"] = np.asarray(img.header.get_data_shape())
+            # read through the array proxy: intensity scaling (scl_slope/scl_inter) is still
+            # applied, but no float64 intermediate is created for unscaled volumes
+            array = np.asanyarray(img.dataobj)
+            if self.dtype is not None:
+                array = array.astype(self.dtype, copy=False)
+            d[key] = array
+            d["{}_{}".format(key, self.meta_key_postfix)] = header
+        return d
+
+
+def separable_gaussian_smooth(images: torch.Tensor, sigmas_x: torch.Tensor,
+                              sigmas_y: torch.Tensor) -> torch.Tensor:
+    """
+    Smooth a batch of 2D images with per-sample Gaussian kernels, implemented as two separable
+    1D grouped convolutions (one per spatial axis) instead of a dense 2D kernel.
+    The batch is folded into the channel dimension so a single conv2d call applies a different
+    kernel to each sample.
+    Args:
+        images: tensor of shape [B, C, H, W].
+        sigmas_x: tensor of shape [B], smoothing sigma along the first spatial axis per sample.
+        sigmas_y: tensor of shape [B], smoothing sigma along the second spatial axis per sample.
+    Return:
+        the smoothed batch, same shape as the input.
+    """
+    nr_samples, nr_channels = images.shape[0], images.shape[1]
+    # truncate the kernels at 4 sigma, as scipy.ndimage.gaussian_filter does
+    radius = max(int(float(torch.max(sigmas_x.max(), sigmas_y.max())) * 4 + 0.5), 1)
+    positions = torch.arange(-radius, radius + 1, device=images.device, dtype=images.dtype)
+
+    def _normalized_kernels(sigmas):
+        kernels = torch.exp(-0.5 * (positions[None, :] / sigmas[:, None].to(images.dtype)) ** 2)
+        kernels = kernels / kernels.sum(dim=1, keepdim=True)
+        return kernels.repeat_interleave(nr_channels, dim=0)
+
+    flat = images.reshape(1, nr_samples * nr_channels, images.shape[2], images.shape[3])
+    flat = torch.nn.functional.conv2d(flat, _normalized_kernels(sigmas_x).reshape(-1, 1, 2 * radius + 1, 1),
+                                      padding=(radius, 0), groups=nr_samples * nr_channels)
+    flat = torch.nn.functional.conv2d(flat, _normalized_kernels(sigmas_y).reshape(-1, 1, 1, 2 * radius + 1),
+                                      padding=(0, radius), groups=nr_samples * nr_channels)
+    return flat.reshape(images.shape)
+
+
+class RandBatchAugmentGPU:
+    """
+    Apply the random training augmentations to a whole batch of 2D patches directly on the
+    compute device, as a faster alternative to the per-sample CPU dict transforms
+    (RandZoomd, RandRotated, RandFlipd, RandGaussianNoised, RandGaussianSmoothd,
+    RandScaleIntensityd).
+    Zoom, rotation and flipping are fused into a single affine resampling per sample, so
+    each patch is interpolated at most once, and the Gaussian smoothing runs as separable
+    grouped convolutions over the whole batch. Patches that do not draw any spatial
+    augmentation are left untouched (no identity resampling).
+    Default parameters mirror the CPU transform pipeline used for training.
+
+    Args:
+        zoom_range: (min, max) zoom factors.
+        zoom_prob: probability of applying the zoom to each sample.
+        rotate_range: rotation angles are drawn uniformly in (-rotate_range, rotate_range) radians.
+        rotate_prob: probability of applying the rotation to each sample.
+        noise_std: standard deviation of the additive Gaussian noise.
+        noise_prob: probability of applying the noise to each sample.
+        smooth_sigma_range: (min, max) of the per-axis Gaussian smoothing sigmas.
+        smooth_prob: probability of applying the Gaussian smoothing to each sample.
+        scale_factors: intensity scaling factors are drawn uniformly in (-scale_factors, scale_factors).
+        scale_prob: probability of applying the intensity scaling to each sample.
+        flip_prob: probability of flipping both spatial axes of each sample.
+    """
+
+    def __init__(self,
+                 zoom_range: Tuple[float, float] = (0.9, 1.2),
+                 zoom_prob: float = 0.16,
+                 rotate_range: float = np.pi / 2,
+                 rotate_prob: float = 0.2,
+                 noise_std: float = 0.01,
+                 noise_prob: float = 0.15,
+                 smooth_sigma_range: Tuple[float, float] = (0.5, 1.15),
+                 smooth_prob: float = 0.15,
+                 scale_factors: float = 0.3,
+                 scale_prob: float = 0.15,
+                 flip_prob: float = 0.5) -> None:
+        self.zoom_range = zoom_range
+        self.zoom_prob = zoom_prob
+        self.rotate_range = rotate_range
+        self.rotate_prob = rotate_prob
+        self.noise_std = noise_std
+        self.noise_prob = noise_prob
+        self.smooth_sigma_range = smooth_sigma_range
+        self.smooth_prob = smooth_prob
+        self.scale_factors = scale_factors
+        self.scale_prob = scale_prob
+        self.flip_prob = flip_prob
+
+    def __call__(self, images: torch.Tensor, labels: torch.Tensor):
+        """
+        Args:
+            images: image batch of shape [B, C, H, W], already on the compute device.
+            labels: label batch of shape [B, C, H, W], already on the compute device.
+        Return:
+            (images, labels) with the augmentations applied.
+        """
+        nr_samples = images.shape[0]
+        device = images.device
+
+        # draw the per-sample spatial augmentation parameters
+        do_zoom = torch.rand(nr_samples, device=device) < self.zoom_prob
+        zoom = torch.where(do_zoom,
+                           torch.empty(nr_samples, device=device).uniform_(*self.zoom_range),
+                           torch.ones(nr_samples, device=device))
+        do_rotate = torch.rand(nr_samples, device=device) < self.rotate_prob
+        angle = torch.where(do_rotate,
+                            torch.empty(nr_samples, device=device).uniform_(-self.rotate_range,
+                                                                            self.rotate_range),
+                            torch.zeros(nr_samples, device=device))
+        do_flip = torch.rand(nr_samples, device=device) < self.flip_prob
+
+        to_resample = do_zoom | do_rotate | do_flip
+        if to_resample.any():
+            idx = torch.where(to_resample)[0]
+            # compose zoom, rotation and flip of both axes into one affine matrix per sample
+            cos = torch.cos(angle[idx]) / zoom[idx]
+            sin = torch.sin(angle[idx]) / zoom[idx]
+            theta = torch.zeros(len(idx), 2, 3, device=device)
+            theta[:, 0, 0] = cos
+            theta[:, 0, 1] = -sin
+            theta[:, 1, 0] = sin
+            theta[:, 1, 1] = cos
+            # flipping both spatial axes is equivalent to negating the affine matrix
+            flip_sign = torch.where(do_flip[idx],
+                                    -torch.ones(len(idx), device=device),
+                                    torch.ones(len(idx), device=device))
+            theta = theta * flip_sign[:, None, None]
+            grid = torch.nn.functional.affine_grid(theta, list(images[idx].shape), align_corners=True)
+            images[idx] = torch.nn.functional.grid_sample(images[idx], grid, mode='bilinear',
+                                                          padding_mode='zeros', align_corners=True)
+            labels[idx] = torch.nn.functional.grid_sample(labels[idx], grid, mode='nearest',
+                                                          padding_mode='border', align_corners=True)
+
+        # additive Gaussian noise
+        do_noise = torch.rand(nr_samples, device=device) < self.noise_prob
+        if do_noise.any():
+            noise = torch.randn_like(images) * self.noise_std
+            images = images + noise * do_noise[:, None, None, None].to(images.dtype)
+
+        # per-sample Gaussian smoothing with separable grouped convolutions
+        do_smooth = torch.rand(nr_samples, device=device) < self.smooth_prob
+        if do_smooth.any():
+            idx = torch.where(do_smooth)[0]
+            sigmas_x = torch.empty(len(idx), device=device).uniform_(*self.smooth_sigma_range)
+            sigmas_y = torch.empty(len(idx), device=device).uniform_(*self.smooth_sigma_range)
+            images[idx] = separable_gaussian_smooth(images[idx], sigmas_x, sigmas_y)
+
+        # multiplicative intensity scaling
+        do_scale = torch.rand(nr_samples, device=device) < self.scale_prob
+        if do_scale.any():
+            factors = torch.where(do_scale,
+                                  1.0 + torch.empty(nr_samples, device=device).uniform_(-self.scale_factors,
+                                                                                        self.scale_factors),
+                                  torch.ones(nr_samples, device=device))
+            images = images * factors[:, None, None, None].to(images.dtype)
+
+        return images, labels
+
+
+class RandAffineSkipd(RandAffined):
+    """
+    Same as the MONAI RandAffined transform, but returns the data untouched when the
+    probability draw fails. The 0.3.0 implementation resamples every sample through an
+    identity grid even when no random transform is drawn, so each sample pays a grid_sample
+    call regardless of prob; skipping the resampling entirely keeps the augmentation
+    statistics identical while only doing the interpolation work for the transformed samples.
+    See also :py:class:`monai.transforms.RandAffined`
+    """
+
+    def __call__(self,
+                 data: Mapping[Hashable, Union[np.ndarray, torch.Tensor]]
+                 ) -> Dict[Hashable, Union[np.ndarray, torch.Tensor]]:
+        self.randomize()
+        if not self.rand_affine.do_transform:
+            return dict(data)
+        d = dict(data)
+        sp_size = fall_back_tuple(self.rand_affine.spatial_size, data[self.keys[0]].shape[1:])
+        grid = self.rand_affine.rand_affine_grid(spatial_size=sp_size)
+        for idx, key in enumerate(self.keys):
+            d[key] = self.rand_affine.resampler(d[key], grid,
+                                                mode=self.mode[idx], padding_mode=self.padding_mode[idx])
+        return d
+
+
 class InPlaneSpacingd(Spacingd):
     """
     Performs the same operation as the MONAI Spacingd transform, but allows to preserve the spacing along some axes,
@@ -13,7 +13,7 @@
 import re
 import os
 import sys
-from setuptools import setup, find_packages
+from setuptools import setup
 
 
 about = {}
@@ -26,10 +26,9 @@ with open("README.md", "r") as fh:
 
 
 def install_requires(fname="requirements.txt"):
+    # one read + one C-level split instead of iterating the file line by line
     with open(fname) as f:
-        content = f.readlines()
-    content = [x.strip() for x in content]
-    return content
+        return f.read().splitlines()
 
 
 setup(name='MONAIfbs',
@@ -41,7 +40,15 @@ setup(name='MONAIfbs',
       author=about["__author__"],
       author_email=about["__email__"],
       license=about["__license__"],
-      packages=find_packages(),
+      # the package layout is fixed, so list the packages explicitly instead of walking the
+      # whole tree with find_packages() (which could also pick up stray cache directories)
+      packages=['monaifbs',
+                'monaifbs.src',
+                'monaifbs.src.train',
+                'monaifbs.src.inference',
+                'monaifbs.src.utils'],
+      package_data={'monaifbs': ['config/*.yml', 'config/*.txt']},
+      include_package_data=True,
       install_requires=install_requires(),
       zip_safe=False,
       keywords='Fetal brain segmentation with dynUnet',